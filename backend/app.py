@@ -8,9 +8,13 @@ It creates the Flask app and starts the server.
 """
 
 import os
+import logging
 from src import create_app
 from src.extensions import socketio
 
+# Log level for the server's own messages (set LOG_LEVEL=WARNING in production)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
 # Create the Flask application using our factory function
 app = create_app()
 
@@ -11,12 +11,18 @@ start a Flask application. It sets up the app, loads config, and connects plugin
 from gevent import monkey
 # Patch standard library to be async-compatible.
 # This makes time.sleep(), socket operations, etc. work with gevent.
-monkey.patch_all()
+# Threading is left native: nothing here relies on patched locks/events (Flask's
+# request context uses contextvars), and real threads stay available for CPU-bound
+# work. Subprocess stays patched so waiting on the code runner doesn't block the hub.
+# The game state has no locks: it relies on gevent only switching greenlets at I/O.
+monkey.patch_all(thread=False)
 
 import os
+
 from flask import Flask
 from flask_cors import CORS
 from .extensions import socketio
+from .game_state import rooms, socket_to_player, run_delta_flusher
 
 def create_app():
     """
@@ -27,10 +33,16 @@ def create_app():
     # 1. CONFIGURATION
     # Secret key is used for secure sessions (not strictly needed for this socket app but good practice)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    # Dev-only socket events (debug rewards, test messages, auto-complete).
+    # Off unless explicitly enabled, so a deployment can't be cheated by forgetting to set it.
+    app.config['ENABLE_DEBUG_EVENTS'] = os.getenv('ENABLE_DEBUG_EVENTS', 'false').lower() == 'true'
     
     # 2. SETUP CORS (Cross-Origin Resource Sharing)
     # Allows the frontend (running on port 5173) to talk to this backend (port 5000)
-    CORS(app, resources={r"/*": {"origins": "*"}})
+    # max_age lets the browser cache the OPTIONS preflight instead of repeating it
+    # before every request (some browsers clamp this, e.g. Chrome caps it at 600s).
+    cors_max_age = int(os.getenv('CORS_MAX_AGE', 86400))
+    CORS(app, resources={r"/*": {"origins": "*"}}, max_age=cors_max_age, supports_credentials=False)
     
     # 3. INITIALIZE SOCKETIO
     # Connect the socketio plugin to this specific app instance
@@ -41,10 +53,13 @@ def create_app():
     # and register the event handlers.
     from . import events
     
+    # 5. BACKGROUND TASKS
+    # Timer changes from rewards are batched per room and sent every 100ms
+    socketio.start_background_task(run_delta_flusher)
+    
     # Simple health check route
     @app.route('/')
     def index():
-        from .game_state import game_state
-        return {'status': 'CodeBattles Server Running', 'players': len(game_state['players'])}
+        return {'status': 'CodeBattles Server Running', 'rooms': len(rooms), 'players': len(socket_to_player)}
         
     return app
@@ -6,8 +6,9 @@ We use it to keep our main code clean and to make it easy to find and update
 things like game rules or, in this case, the coding problems.
 """
 
-# A list of dictionaries, where each dictionary represents a coding problem card.
-PROBLEM_TEMPLATES = [
+# A tuple of dictionaries, where each dictionary represents a coding problem card.
+# Cards share these dictionaries instead of copying them, so treat them as read-only.
+PROBLEM_TEMPLATES = (
     {
         'problem': {
             'title': 'Two Sum',
@@ -133,4 +134,4 @@ PROBLEM_TEMPLATES = [
         },
         'reward': {'type': 'debuff', 'target': 'targeted', 'effect': 'flashbang_targeted', 'value': 1}
     }
-]
+)
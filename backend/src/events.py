@@ -5,20 +5,96 @@ This file handles all the network events.
 Updated to support multiple rooms with unique room codes!
 """
 
+import os
 import time
-import uuid
-from flask import request
+import logging
+import functools
+import contextlib
+from flask import request, current_app
 from flask_socketio import emit, join_room, leave_room
 
 # Import from our other modules
 from .extensions import socketio
 from .game_state import (
-    socket_to_player, rooms,
-    get_or_create_room, get_room, delete_room_if_empty,
-    generate_card, apply_reward, check_win_condition
+    Player, socket_to_player, rooms,
+    get_or_create_room, get_room, delete_room_if_empty, new_player_id,
+    generate_card, deal_cards, apply_reward, check_win_condition,
+    shorten_timer
 )
 from .utils import execute_code
 
+# Lazy %-style arguments: the message is only formatted if the level is enabled
+logger = logging.getLogger(__name__)
+
+def _public_players(room, viewer_id=None):
+    """
+    Client-facing view of the room's players, built in a single pass.
+    If viewer_id is given, only that player's full hand is included; everyone
+    else's is trimmed to the card they're working on.
+    """
+    if viewer_id is None:
+        return {pid: p.to_public() for pid, p in room['players'].items()}
+    return {pid: p.to_public(pid == viewer_id) for pid, p in room['players'].items()}
+
+# Payload builders for events sent from more than one place or on every solve.
+# Event names are plain string literals: Python already interns those at compile time.
+
+def _game_state_payload(room_code, room, viewer_id):
+    """Snapshot of a room for one client: their own hand plus everyone's public fields."""
+    return {
+        'players': _public_players(room, viewer_id),
+        'gameStatus': room['gameStatus'],
+        'roomCode': room_code,
+        'winner': room.get('winner')
+    }
+
+def _build_pass_payload(player_id, card_id, test_results, new_card):
+    """Body of 'solution_passed'."""
+    return {
+        'playerId': player_id,
+        'cardId': card_id,
+        'testResults': test_results,
+        'newCard': new_card
+    }
+
+def require_player(fn):
+    """
+    Decorator for handlers that only make sense for a player in a room.
+    Resolves the sender's socket to (player_id, room_code, room) with one lookup
+    each and passes them in front of the event's own arguments. Events from
+    sockets that aren't in a room are ignored.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args):
+        mapping = socket_to_player.get(request.sid)
+        if mapping is None: return
+        player_id, room_code = mapping
+        room = rooms.get(room_code)
+        if room is None: return
+        return fn(player_id, room_code, room, *args)
+    return wrapper
+
+# Each submission is graded in its own subprocess. Cap how many run at once so a
+# burst of submissions queues up instead of oversubscribing the CPU. At least 1,
+# otherwise every submission would wait forever.
+GRADER_CONCURRENCY = max(1, int(os.getenv('GRADER_CONCURRENCY', os.cpu_count() or 1)))
+_grader_slots = None
+
+@contextlib.contextmanager
+def _grading_slot():
+    """Wait for a free grading slot (cooperatively under gevent) and hold it."""
+    global _grader_slots
+    if _grader_slots is None:
+        # Created on first use: the queue type depends on the async mode picked in init_app
+        _grader_slots = socketio.server.eio.create_queue()
+        for _ in range(GRADER_CONCURRENCY):
+            _grader_slots.put(None)
+    _grader_slots.get()
+    try:
+        yield
+    finally:
+        _grader_slots.put(None)
+
 # --------------------------
 # CONNECTION EVENTS
 # --------------------------
@@ -26,23 +102,31 @@ from .utils import execute_code
 @socketio.on('connect')
 def handle_connect():
     """Called when a client opens a connection."""
-    print(f'Client connected: {request.sid}')
+    logger.debug('Client connected: %s', request.sid)
     emit('connected', {'socketId': request.sid})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Called when a client drops connection."""
     socket_id = request.sid
-    print(f'Client disconnected: {socket_id}')
+    logger.debug('Client disconnected: %s', socket_id)
     
     # Clean up player data
     if socket_id in socket_to_player:
         player_id, room_code = socket_to_player[socket_id]
         room = get_room(room_code)
         
-        if room and player_id in room['players']:
-            player_name = room['players'][player_id]['username']
-            del room['players'][player_id]
+        player = room['players'].pop(player_id, None) if room else None
+        if player:
+            player_name = player.username
+            if not player.is_eliminated:
+                room['active_count'] -= 1
+            # Don't send a queued timer update for someone who's gone
+            room['pending_deltas'].pop(player_id, None)
+            
+            # Hand host over to the longest-standing remaining player
+            if room['host_id'] == player_id:
+                room['host_id'] = next(iter(room['players']), None)
             
             # Tell others in the room they left
             emit('player_left', {
@@ -50,11 +134,12 @@ def handle_disconnect():
                 'username': player_name
             }, room=room_code)
             
-            # Check win condition
-            check_win_condition(room_code)
-            
-            # Clean up empty room
-            delete_room_if_empty(room_code)
+            if room['players']:
+                # Check win condition
+                check_win_condition(room_code)
+            else:
+                # Clean up empty room
+                delete_room_if_empty(room_code)
         
         del socket_to_player[socket_id]
 
@@ -76,7 +161,7 @@ def handle_join_room(data):
         return
     
     socket_id = request.sid
-    player_id = str(uuid.uuid4())
+    player_id = new_player_id()
     
     # Get or create room
     if room_code:
@@ -96,20 +181,10 @@ def handle_join_room(data):
     socket_to_player[socket_id] = (player_id, room_code)
     
     # Create player
-    player = {
-        'id': player_id,
-        'username': username,
-        'socket_id': socket_id,
-        'timerEndTime': None,
-        'isEliminated': False,
-        'eliminatedAt': None,
-        'currentProblem': None,
-        'cards': [],
-        'isTimeFrozen': False,
-        'frozenUntil': None
-    }
-    
-    room['players'][player_id] = player
+    room['players'][player_id] = Player(player_id, username, socket_id)
+    room['active_count'] += 1
+    if room['host_id'] is None:
+        room['host_id'] = player_id
     
     # Broadcast to room
     emit('player_joined', {
@@ -119,14 +194,9 @@ def handle_join_room(data):
     }, room=room_code)
     
     # Send game state to new player
-    emit('game_state', {
-        'players': room['players'],
-        'gameStatus': room['gameStatus'],
-        'roomCode': room_code,
-        'winner': room.get('winner')
-    }, room=socket_id)
+    emit('game_state', _game_state_payload(room_code, room, player_id), room=socket_id)
     
-    print(f'Player {username} ({player_id}) joined room {room_code}')
+    logger.info('Player %s (%s) joined room %s', username, player_id, room_code)
 
 
 @socketio.on('start_game')
@@ -146,62 +216,48 @@ def handle_start_game():
         return
     
     # First player is host
-    first_player_id = list(room['players'].keys())[0]
-    if player_id != first_player_id:
+    if player_id != room['host_id']:
         emit('error', {'message': 'Only host can start game'})
         return
     
+    now_ms = time.time() * 1000
     room['gameStatus'] = 'playing'
     
     # Set timer: 5 minutes from now
-    timer_end_time = (time.time() + 300) * 1000
-    for pid in room['players'].keys():
-        room['players'][pid]['timerEndTime'] = timer_end_time
+    timer_end_time = now_ms + 300_000
     
-    # Deal 5 cards to each player
-    for pid in room['players'].keys():
-        cards = [generate_card() for _ in range(5)]
-        room['players'][pid]['cards'] = cards
+    # Deal 5 cards to each player, drawing the whole deck in one batch
+    players = room['players']
+    card_pool = deal_cards(5 * len(players))
+    for i, p in enumerate(players.values()):
+        p.timer_end_time = timer_end_time
+        p.set_hand(card_pool[i * 5:(i + 1) * 5])
     
     # Broadcast to room
     emit('game_started', {
-        'players': {pid: {
-            'id': p['id'],
-            'username': p['username'],
-            'timerEndTime': p['timerEndTime'],
-            'isEliminated': p['isEliminated'],
-            'eliminatedAt': p.get('eliminatedAt'),
-            'currentProblem': p['currentProblem'],
-            'cards': p['cards']
-        } for pid, p in room['players'].items()}
+        'players': _public_players(room)
     }, room=room_code)
     
-    print(f'Game started in room {room_code}')
+    logger.info('Game started in room %s', room_code)
 
 # --------------------------
 # GAMEPLAY EVENTS
 # --------------------------
 
 @socketio.on('select_card')
-def handle_select_card(data):
+@require_player
+def handle_select_card(player_id, room_code, room, data):
     """Player selected a card."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
-    
-    player_id, room_code = socket_to_player[socket_id]
-    room = get_room(room_code)
-    if not room: return
-    
     card_id = data.get('cardId')
-    if player_id not in room['players']: return
+    player = room['players'].get(player_id)
+    if player is None: return
     
-    player = room['players'][player_id]
-    card = next((c for c in player['cards'] if c['id'] == card_id), None)
+    card = player.cards_by_id.get(card_id)
     if not card:
         emit('error', {'message': 'Card not found'})
         return
     
-    player['currentProblem'] = card_id
+    player.current_problem = card_id
     
     emit('card_selected', {
         'playerId': player_id,
@@ -211,41 +267,58 @@ def handle_select_card(data):
 
 
 @socketio.on('submit_solution')
-def handle_submit_solution(data):
+@require_player
+def handle_submit_solution(player_id, room_code, room, data):
     """Player submitted code."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
-    
-    player_id, room_code = socket_to_player[socket_id]
-    room = get_room(room_code)
-    if not room: return
-    
     card_id = data.get('cardId')
     code = data.get('code', '')
     
-    if player_id not in room['players']: return
-    player = room['players'][player_id]
+    player = room['players'].get(player_id)
+    if player is None: return
     
-    if player['isEliminated']:
+    if player.is_eliminated:
         emit('error', {'message': 'Player is eliminated'})
         return
     
-    card = next((c for c in player['cards'] if c['id'] == card_id), None)
+    card = player.cards_by_id.get(card_id)
     if not card:
         emit('error', {'message': 'Card not found'})
         return
     
-    if player['currentProblem'] != card_id:
+    if player.current_problem != card_id:
         emit('error', {'message': 'Card is not currently selected'})
         return
     
+    # Tell the submitter how each test went as soon as it finishes
+    test_cases = card['problem']['testCases']
+    socket_id = request.sid
+    def report_progress(index, test_result):
+        emit('test_result', {
+            'cardId': card_id,
+            'index': index,
+            'total': len(test_cases),
+            'result': test_result
+        }, room=socket_id)
+    
     # Execute code
-    result = execute_code(code, card['problem']['functionSignature'], card['problem']['testCases'])
+    with _grading_slot():
+        result = execute_code(
+            code, card['problem']['functionSignature'], test_cases,
+            allow_debug_skip=current_app.config['ENABLE_DEBUG_EVENTS'],
+            on_result=report_progress
+        )
     
     if result['passed']:
-        # Remove card, clear selection
-        player['cards'] = [c for c in player['cards'] if c['id'] != card_id]
-        player['currentProblem'] = None
+        # Other events ran while we were grading (up to 10s, plus waiting for a slot).
+        # Only pay out if the player is still in a running game and not eliminated.
+        if (room['players'].get(player_id) is not player or player.is_eliminated
+                or room['gameStatus'] != 'playing'):
+            return
+        
+        # Remove card, clear selection. If a duplicate submission already
+        # claimed this card, don't reward it twice.
+        if player.remove_card(card_id) is None: return
+        player.current_problem = None
         
         # Apply reward
         if card.get('reward'):
@@ -253,16 +326,11 @@ def handle_submit_solution(data):
         
         # Give new card
         new_card = generate_card()
-        player['cards'].append(new_card)
+        player.add_card(new_card)
         
-        emit('solution_passed', {
-            'playerId': player_id,
-            'cardId': card_id,
-            'testResults': result['testResults'],
-            'newCard': new_card
-        }, room=room_code)
+        emit('solution_passed', _build_pass_payload(player_id, card_id, result['testResults'], new_card), room=room_code)
         
-        print(f'Player {player["username"]} passed {card["problem"]["title"]} in room {room_code}')
+        logger.debug('Player %s passed %s in room %s', player.username, card['problem']['title'], room_code)
     else:
         emit('solution_failed', {
             'playerId': player_id,
@@ -273,119 +341,89 @@ def handle_submit_solution(data):
 
 
 @socketio.on('player_eliminated')
-def handle_player_eliminated(data):
+@require_player
+def handle_player_eliminated(player_id, room_code, room, data=None):
     """Player's timer hit 0."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
-    
-    player_id, room_code = socket_to_player[socket_id]
-    room = get_room(room_code)
-    if not room or player_id not in room['players']: return
-    
-    player = room['players'][player_id]
-    if player['isEliminated']: return
+    player = room['players'].get(player_id)
+    if player is None or player.is_eliminated: return
     
-    player['isEliminated'] = True
-    player['eliminatedAt'] = time.time() * 1000
-    player['timeRemaining'] = 0
+    now_ms = time.time() * 1000
+    player.is_eliminated = True
+    room['active_count'] -= 1
+    player.eliminated_at = now_ms
     
     emit('player_eliminated', {
         'playerId': player_id,
-        'username': player['username'],
-        'eliminatedAt': player['eliminatedAt']
+        'username': player.username,
+        'eliminatedAt': player.eliminated_at
     }, room=room_code)
     
-    print(f'Player {player["username"]} eliminated in room {room_code}')
+    logger.info('Player %s eliminated in room %s', player.username, room_code)
     check_win_condition(room_code)
 
 
 @socketio.on('apply_targeted_debuff')
-def handle_apply_targeted_debuff(data):
+@require_player
+def handle_apply_targeted_debuff(player_id, room_code, room, data):
     """Player selected target for debuff."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
-    
-    player_id, room_code = socket_to_player[socket_id]
-    room = get_room(room_code)
-    if not room: return
-    
     target_id = data.get('targetPlayerId')
     player = room['players'].get(player_id)
     
-    if not player or 'pendingTargetedReward' not in player:
+    if not player or player.pending_targeted_reward is None:
         emit('error', {'message': 'No pending reward'})
         return
     
-    if target_id not in room['players']:
+    target_player = room['players'].get(target_id)
+    if target_player is None:
         emit('error', {'message': 'Invalid target'})
         return
     
-    target_player = room['players'][target_id]
-    if target_player['isEliminated']:
+    if target_player.is_eliminated:
         emit('error', {'message': 'Cannot target eliminated player'})
         return
     
-    reward = player['pendingTargetedReward']
+    reward = player.pending_targeted_reward
+    now_ms = time.time() * 1000
     
     if reward['effect'] == 'remove_time_targeted':
-        room['players'][target_id]['timerEndTime'] = max(
-            time.time() * 1000,
-            room['players'][target_id]['timerEndTime'] - (reward['value'] * 1000)
-        )
-        
-        emit('reward_applied', {
-            'playerId': target_id,
-            'effect': 'remove_time_targeted',
-            'value': reward['value'],
-            'fromPlayer': player_id,
-            'targetName': target_player['username']
-        }, room=room_code)
+        shorten_timer(room, target_player, reward['value'] * 1000, now_ms)
         
     elif reward['effect'] == 'flashbang_targeted':
         emit('flashbang_applied', {
             'fromPlayer': player_id,
-            'fromUsername': player['username']
-        }, room=target_player['socket_id'])
+            'fromUsername': player.username
+        }, room=target_player.socket_id)
     
-    player['pendingTargetedReward'] = None
+    player.pending_targeted_reward = None
 
 
 @socketio.on('debug_trigger_reward')
-def handle_debug_trigger_reward(data):
+@require_player
+def handle_debug_trigger_reward(player_id, room_code, room, data):
     """Dev tool to trigger rewards."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
+    if not current_app.config['ENABLE_DEBUG_EVENTS']: return
     
-    player_id, room_code = socket_to_player[socket_id]
     reward = data.get('reward')
     
     if reward:
         apply_reward(room_code, player_id, reward, is_debug=True)
 
 @socketio.on('get_game_state')
-def handle_get_game_state():
+@require_player
+def handle_get_game_state(player_id, room_code, room):
     """Request state refresh."""
-    socket_id = request.sid
-    if socket_id not in socket_to_player: return
-    
-    player_id, room_code = socket_to_player[socket_id]
-    room = get_room(room_code)
-    
-    if room:
-        emit('game_state', {
-            'players': room['players'],
-            'gameStatus': room['gameStatus'],
-            'roomCode': room_code,
-            'winner': room.get('winner')
-        }, room=socket_id)
+    emit('game_state', _game_state_payload(room_code, room, player_id), room=request.sid)
 
 @socketio.on('test_message')
-def handle_test_message(data):
-    """Test message handler."""
+@require_player
+def handle_test_message(player_id, room_code, room, data):
+    """Test message handler. Echoes to the sender's room only, never server-wide."""
+    if not current_app.config['ENABLE_DEBUG_EVENTS']: return
+    
     from_name = data.get('from', 'Unknown')
     message = data.get('message', '')
     if message:
         emit('test_message', {
             'from': from_name,
             'message': message
-        }, broadcast=True, include_self=True)
+        }, room=room_code, include_self=True)
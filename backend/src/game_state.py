@@ -5,13 +5,83 @@ This file manages the "Brain" of the game.
 Now supports MULTIPLE rooms with unique room codes!
 """
 
-import uuid
 import time
 import random
+import itertools
+import logging
 import string
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from flask_socketio import emit
 from .constants import PROBLEM_TEMPLATES
+from .extensions import socketio
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# PLAYER
+# --------------------------
+
+class Player:
+    """
+    A single player in a room.
+    Uses __slots__ instead of a per-instance dict: smaller objects and faster
+    attribute access on the hot socket paths.
+    """
+    __slots__ = (
+        'id', 'username', 'socket_id',
+        'timer_end_time', 'is_eliminated', 'eliminated_at', 'current_problem',
+        'cards', 'cards_by_id', 'pending_targeted_reward'
+    )
+    
+    def __init__(self, player_id: str, username: str, socket_id: str) -> None:
+        self.id = player_id
+        self.username = username
+        self.socket_id = socket_id
+        self.timer_end_time: Optional[float] = None
+        self.is_eliminated = False
+        self.eliminated_at: Optional[float] = None
+        self.current_problem: Optional[str] = None
+        self.cards: List[Dict[str, Any]] = []
+        self.cards_by_id: Dict[str, Dict[str, Any]] = {}  # Index of 'cards' by card id for O(1) lookups
+        self.pending_targeted_reward: Optional[Dict[str, Any]] = None
+    
+    # 'cards' keeps the hand order the client sees; 'cards_by_id' indexes the same
+    # dicts for O(1) lookup. Always change the hand through these so both stay in sync.
+    def set_hand(self, cards: List[Dict[str, Any]]) -> None:
+        self.cards = cards
+        self.cards_by_id = {c['id']: c for c in cards}
+    
+    def add_card(self, card: Dict[str, Any]) -> None:
+        self.cards.append(card)
+        self.cards_by_id[card['id']] = card
+    
+    def remove_card(self, card_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a card from the hand. Returns it, or None if it wasn't there."""
+        card = self.cards_by_id.pop(card_id, None)
+        if card is not None:
+            self.cards.remove(card)
+        return card
+    
+    def to_public(self, full_hand: bool = True) -> Dict[str, Any]:
+        """
+        Client-facing view (mirrors the `Player` interface in gameStore.ts).
+        With full_hand=False only the card being worked on is included: that's all
+        an opponent's sidebar entry shows.
+        """
+        if full_hand:
+            cards = self.cards
+        else:
+            current = self.cards_by_id.get(self.current_problem) if self.current_problem else None
+            cards = [current] if current else []
+        return {
+            'id': self.id,
+            'username': self.username,
+            'timerEndTime': self.timer_end_time,
+            'isEliminated': self.is_eliminated,
+            'eliminatedAt': self.eliminated_at,
+            'currentProblem': self.current_problem,
+            'cards': cards
+        }
 
 # --------------------------
 # GLOBAL STATE
@@ -21,9 +91,26 @@ from .constants import PROBLEM_TEMPLATES
 socket_to_player: Dict[str, tuple[str, str]] = {}
 
 # Dictionary of all active rooms
-# Structure: { 'ABCD12': { 'players': {}, 'gameStatus': 'lobby', 'winner': None }, ... }
+# Structure: { 'ABCD12': { 'players': {}, 'gameStatus': 'lobby', 'winner': None, 'host_id': None,
+#                          'active_count': 0, 'pending_deltas': {} }, ... }
 rooms: Dict[str, Dict[str, Any]] = {}
 
+# Dedicated RNG for dealing cards and picking debuff targets, so game draws don't
+# share (or get reseeded through) the module-level generator other code may use.
+_rng = random.Random()
+
+# Card and player ids only need to be unique inside this process (rooms live in
+# memory and are gone on restart), so a counter is enough: no syscall, and the
+# short ids are cheap to hash and small on the wire.
+_next_id = itertools.count(1).__next__
+
+# Card templates unpacked once at import into (problem, reward, challenge) tuples.
+# Cards reference these shared dicts directly, so they must never be mutated.
+def _template_parts(template: Dict[str, Any]) -> tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    return (template['problem'], template.get('reward'), template.get('challenge'))
+
+_CARD_TEMPLATES = tuple(_template_parts(t) for t in PROBLEM_TEMPLATES)
+
 # --------------------------
 # HELPER FUNCTIONS
 # --------------------------
@@ -56,34 +143,69 @@ def get_or_create_room(room_code: Optional[str] = None) -> tuple[str, Dict[str,
         'players': {},
         'gameStatus': 'lobby',
         'winner': None,
-        'roomCode': room_code
+        'roomCode': room_code,
+        'host_id': None,  # Player ID of the host, set when the first player joins
+        'active_count': 0,  # Players in the room who are not eliminated
+        'pending_deltas': {}  # player_id -> new timerEndTime, flushed by run_delta_flusher()
     }
     
-    print(f'Created new room: {room_code}')
+    logger.info('Created new room: %s', room_code)
     return room_code, rooms[room_code]
 
+def new_player_id() -> str:
+    """Unique id for a player joining a room."""
+    return f'p{_next_id():x}'
+
 def get_room(room_code: str) -> Optional[Dict[str, Any]]:
     """Get a room by code, returns None if doesn't exist."""
     return rooms.get(room_code)
 
-def delete_room_if_empty(room_code: str):
+def delete_room_if_empty(room_code: str) -> None:
     """Delete a room if it has no players."""
     if room_code in rooms and len(rooms[room_code]['players']) == 0:
         del rooms[room_code]
-        print(f'Deleted empty room: {room_code}')
+        logger.info('Deleted empty room: %s', room_code)
+
+def queue_timer_update(room: Dict[str, Any], player: Player) -> None:
+    """Mark a player's new timerEndTime to be sent with the room's next state_delta."""
+    room['pending_deltas'][player.id] = player.timer_end_time
+
+def flush_pending_deltas() -> None:
+    """
+    Send one 'state_delta' per room with every timer change queued since the last flush.
+    Many rewards landing close together become a single message instead of one each.
+    """
+    # Snapshot: rooms may be created/deleted while we emit
+    for room_code, room in list(rooms.items()):
+        deltas = room['pending_deltas']
+        if not deltas:
+            continue
+        room['pending_deltas'] = {}
+        socketio.emit('state_delta', {
+            'players': {pid: {'timerEndTime': t} for pid, t in deltas.items()}
+        }, to=room_code)
+
+def run_delta_flusher(interval: float = 0.1) -> None:
+    """Background task: flush queued timer updates every `interval` seconds (10Hz default)."""
+    while True:
+        socketio.sleep(interval)
+        flush_pending_deltas()
+
+def deal_cards(count: int) -> List[Dict[str, Any]]:
+    """
+    Creates `count` new random problem cards in one go.
+    The template draws are fetched in a single batch instead of once per card.
+    """
+    return [
+        {'id': f'c{_next_id():x}', 'problem': problem, 'reward': reward, 'challenge': challenge}
+        for problem, reward, challenge in _rng.choices(_CARD_TEMPLATES, k=count)
+    ]
 
 def generate_card() -> Dict[str, Any]:
     """
     Creates a new random problem card for a player.
     """
-    template = random.choice(PROBLEM_TEMPLATES).copy()
-    card = {
-        'id': str(uuid.uuid4()),
-        'problem': template['problem'].copy(),
-        'reward': template.get('reward'),
-        'challenge': template.get('challenge')
-    }
-    return card
+    return deal_cards(1)[0]
 
 def check_win_condition(room_code: str) -> bool:
     """
@@ -91,30 +213,111 @@ def check_win_condition(room_code: str) -> bool:
     Returns True if game ended.
     """
     room = get_room(room_code)
-    if not room:
+    # Only a running game can end; this also avoids re-announcing a winner
+    if not room or room['gameStatus'] != 'playing':
         return False
     
-    active_players = [pid for pid, p in room['players'].items() 
-                     if not p.get('isEliminated', False)]
+    # active_count is kept up to date on join/leave/elimination, so no scan is
+    # needed unless we're actually declaring a winner
+    active_count = room['active_count']
     
-    if len(active_players) == 1:
+    if active_count == 1:
+        winner = next(p for p in room['players'].values() if not p.is_eliminated)
         room['gameStatus'] = 'ended'
-        room['winner'] = active_players[0]
+        room['winner'] = winner.id
         
         emit('game_ended', {
-            'winner': room['winner'],
-            'winnerName': room['players'][active_players[0]]['username']
+            'winner': winner.id,
+            'winnerName': winner.username
         }, room=room_code)
         return True
         
-    elif len(active_players) == 0 and room['players']:
+    elif active_count == 0 and room['players']:
         room['gameStatus'] = 'ended'
         emit('game_ended', {'winner': None}, room=room_code)
         return True
         
     return False
 
-def apply_reward(room_code: str, player_id: str, reward: Dict[str, Any], is_debug: bool = False):
+# --------------------------
+# REWARD EFFECTS
+# --------------------------
+# Each effect is a small function with the same signature, looked up by name in
+# _EFFECT_HANDLERS instead of walking an if/elif chain on every solve.
+
+def _other_active_players(room: Dict[str, Any], player: Player, is_debug: bool) -> List[Player]:
+    """
+    Players an attack can hit. Players with no timer (joined after the game started)
+    aren't in the game. In debug mode a lone player may target themselves.
+    """
+    others = [
+        p for pid, p in room['players'].items()
+        if pid != player.id and not p.is_eliminated and p.timer_end_time is not None
+    ]
+    if is_debug and not others and not player.is_eliminated:
+        others = [player]
+    return others
+
+def shorten_timer(room: Dict[str, Any], target: Player, removed_ms: float, now_ms: float) -> None:
+    """Take time off a player's timer (never into the past) and queue the update."""
+    if target.timer_end_time is None:  # Not in the game
+        return
+    target.timer_end_time = max(now_ms, target.timer_end_time - removed_ms)
+    queue_timer_update(room, target)
+
+def _seconds_left(player: Player, now_ms: float) -> int:
+    """Whole seconds left on a player's timer, 0 if they have none."""
+    if player.timer_end_time is None:
+        return 0
+    return max(0, int((player.timer_end_time - now_ms) / 1000))
+
+def _eff_add_time(room: Dict[str, Any], player: Player, reward: Dict[str, Any], is_debug: bool, now_ms: float) -> None:
+    """Buff: add time to the solver's own timer."""
+    if player.timer_end_time is None:  # Not in the game
+        return
+    player.timer_end_time += reward['value'] * 1000
+    queue_timer_update(room, player)
+
+def _eff_remove_time(room: Dict[str, Any], player: Player, reward: Dict[str, Any], is_debug: bool, now_ms: float) -> None:
+    """Debuff: remove time from one random opponent."""
+    others = _other_active_players(room, player, is_debug)
+    if others:
+        shorten_timer(room, _rng.choice(others), reward['value'] * 1000, now_ms)
+
+def _eff_targeted(room: Dict[str, Any], player: Player, reward: Dict[str, Any], is_debug: bool, now_ms: float) -> None:
+    """Targeted debuff: ask the solver to pick a target (see 'apply_targeted_debuff')."""
+    others = _other_active_players(room, player, is_debug)
+    if others:
+        player.pending_targeted_reward = reward
+        
+        emit('target_selection_required', {
+            'effect': reward['effect'],
+            'value': reward['value'],
+            'availableTargets': [{
+                'playerId': p.id,
+                'username': p.username,
+                'timeRemaining': _seconds_left(p, now_ms)
+            } for p in others]
+        }, room=player.socket_id)
+
+def _eff_remove_time_all(room: Dict[str, Any], player: Player, reward: Dict[str, Any], is_debug: bool, now_ms: float) -> None:
+    """Global attack: remove time from every opponent still in the game."""
+    removed_ms = reward['value'] * 1000
+    for target in _other_active_players(room, player, is_debug):
+        shorten_timer(room, target, removed_ms, now_ms)
+
+# (room, player, reward, is_debug, now_ms)
+EffectHandler = Callable[[Dict[str, Any], Player, Dict[str, Any], bool, float], None]
+
+_EFFECT_HANDLERS: Dict[str, EffectHandler] = {
+    'add_time': _eff_add_time,
+    'remove_time': _eff_remove_time,
+    'remove_time_targeted': _eff_targeted,
+    'flashbang_targeted': _eff_targeted,
+    'remove_time_all': _eff_remove_time_all,
+}
+
+def apply_reward(room_code: str, player_id: str, reward: Dict[str, Any], is_debug: bool = False) -> None:
     """
     Apply a reward in a specific room.
     """
@@ -122,84 +325,9 @@ def apply_reward(room_code: str, player_id: str, reward: Dict[str, Any], is_debu
     if not room:
         return
     
-    effect_type = reward['effect']
-    value = reward['value']
-    
-    # 1. ADD TIME
-    if effect_type == 'add_time':
-        if player_id in room['players']:
-            room['players'][player_id]['timerEndTime'] += value * 1000
-            emit('reward_applied', {
-                'playerId': player_id,
-                'effect': 'add_time',
-                'value': value
-            }, room=room_code)
-    
-    # 2. REMOVE TIME (Random)
-    elif effect_type == 'remove_time':
-        candidates = [pid for pid in room['players'].keys() if not room['players'][pid]['isEliminated']]
-        other_players = [pid for pid in candidates if pid != player_id]
-        
-        if is_debug and not other_players and player_id in candidates:
-            other_players = [player_id]
-            
-        if other_players:
-            target_id = random.choice(other_players)
-            room['players'][target_id]['timerEndTime'] = max(
-                time.time() * 1000,
-                room['players'][target_id]['timerEndTime'] - (value * 1000)
-            )
-            emit('reward_applied', {
-                'playerId': target_id,
-                'effect': 'remove_time',
-                'value': value,
-                'fromPlayer': player_id
-            }, room=room_code)
+    player = room['players'].get(player_id)
+    handler = _EFFECT_HANDLERS.get(reward.get('effect', ''))
+    if player is None or handler is None:
+        return
     
-    # 3. TARGETED DEBUFF
-    elif effect_type in ['remove_time_targeted', 'flashbang_targeted']:
-        candidates = [pid for pid in room['players'].keys() if not room['players'][pid]['isEliminated']]
-        other_players = [pid for pid in candidates if pid != player_id]
-        
-        if is_debug and not other_players:
-            other_players = [player_id]
-            
-        if other_players:
-            room['players'][player_id]['pendingTargetedReward'] = reward
-            
-            emit('target_selection_required', {
-                'effect': effect_type,
-                'value': value,
-                'availableTargets': [{
-                    'playerId': pid,
-                    'username': room['players'][pid]['username'],
-                    'timeRemaining': max(0, int((room['players'][pid]['timerEndTime'] - time.time() * 1000) / 1000))
-                } for pid in other_players]
-            }, room=room['players'][player_id]['socket_id'])
-            
-    # 4. GLOBAL ATTACK
-    elif effect_type == 'remove_time_all':
-        candidates = [pid for pid in room['players'].keys() if not room['players'][pid]['isEliminated']]
-        other_players = [pid for pid in candidates if pid != player_id]
-        
-        if is_debug and not other_players:
-            other_players = [player_id]
-            
-        affected_players = []
-        for target_id in other_players:
-            room['players'][target_id]['timerEndTime'] = max(
-                time.time() * 1000,
-                room['players'][target_id]['timerEndTime'] - (value * 1000)
-            )
-            affected_players.append({
-                'playerId': target_id,
-                'username': room['players'][target_id]['username']
-            })
-        
-        if affected_players:
-            emit('reward_applied', {
-                'effect': 'remove_time_all',
-                'value': value,
-                'fromPlayer': player_id,
-                'affectedPlayers': affected_players
-            }, room=room_code)
+    handler(room, player, reward, is_debug, time.time() * 1000)
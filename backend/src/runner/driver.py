@@ -0,0 +1,132 @@
+"""
+driver.py
+
+The test runner that grades a submission. It runs inside a separate worker
+process started by utils.py, never inside the server itself.
+
+Keeping it in a file (instead of a generated script string) means Python caches
+its compiled bytecode in __pycache__, so every worker starts a little faster.
+"""
+
+import os
+import sys
+import json
+import struct
+import traceback
+import marshal
+import orjson
+
+def limit_resources(memory_mb: int):
+    """
+    Cap what the player's code can use before it runs.
+    'resource' is Unix-only; elsewhere the server's 10 second timeout still applies.
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    memory_limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    resource.setrlimit(resource.RLIMIT_CPU, (10, 10))  # Seconds of CPU time
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))  # Largest file it may write
+
+# Marks a payload encoded by the stdlib json module (see encode())
+STDLIB_JSON_MARKER = b'J'
+
+def encode(result: dict) -> bytes:
+    """
+    JSON-encode one test result. orjson is much faster, but can't encode everything
+    a player's function might return (e.g. ints over 64 bits). Those results are
+    encoded with the stdlib instead and marked, because orjson would also read
+    such ints back as floats. Values neither can encode (e.g. a dict with tuple
+    keys, or a list that contains itself) are sent as their repr().
+    """
+    try:
+        return orjson.dumps(result, default=repr, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        pass
+    try:
+        return STDLIB_JSON_MARKER + json.dumps(result, default=repr).encode()
+    except (TypeError, ValueError):
+        result = {**result, 'actual': repr(result['actual'])}
+        return STDLIB_JSON_MARKER + json.dumps(result, default=repr).encode()
+
+def send_frame(result_file, payload: bytes):
+    """Write one frame: a 4-byte big-endian length, then the payload."""
+    result_file.write(struct.pack('>I', len(payload)) + payload)
+    result_file.flush()
+
+def compile_submission(code: str):
+    """
+    Compile the player's code. If it can't be compiled, report why on stderr (without
+    a traceback through this file) and exit, so the server shows it as the error.
+    """
+    try:
+        return compile(code, '<submission>', 'exec')
+    except Exception as e:  # SyntaxError, or MemoryError/RecursionError for very deeply nested code
+        sys.stderr.write(''.join(traceback.format_exception_only(e)))
+        sys.exit(1)
+
+def run_submission(code, namespace: dict):
+    """
+    Run the player's module-level code. If it raises, report the traceback on stderr
+    showing only the submission's own frames (none from this file) and exit.
+    """
+    try:
+        exec(code, namespace)
+    except Exception as e:
+        frames = [f for f in traceback.extract_tb(e.__traceback__) if f.filename == '<submission>']
+        lines = ['Traceback (most recent call last):\n', *traceback.format_list(frames)] if frames else []
+        sys.stderr.write(''.join(lines + traceback.format_exception_only(e)))
+        sys.exit(1)
+
+def run_tests(job: dict, report):
+    """
+    Run the player's code, then call their function once per test case.
+    Tests are run as data (call the function, compare the result), not generated code.
+    Each result is passed to `report` as soon as that test finishes.
+    """
+    problem = marshal.loads(job['problem'])
+    namespace = {'__name__': '__main__'}
+    run_submission(compile_submission(job['code']), namespace)
+    fn = namespace.get(problem['fn'])
+    
+    for case in problem['cases']:
+        args = case['input']
+        expected = case['expectedOutput']
+        try:
+            if fn is None:
+                raise NameError(f"name {problem['fn']!r} is not defined")
+            actual = fn(**args)
+            passed = actual == expected
+            result = {'passed': passed, 'input': args, 'expected': expected, 'actual': actual}
+        except Exception as e:
+            # If the user's code crashes, record the error
+            passed = False
+            result = {'passed': False, 'input': args, 'expected': expected, 'actual': None, 'error': str(e) or type(e).__name__}
+        report(result)
+        if job['fail_fast'] and not passed:
+            break
+
+def take_stdout():
+    """
+    Keep the real stdout for our results and point fd 1 (and so print()) at /dev/null.
+    Whatever the player's code prints can then never get mixed into the results.
+    """
+    result_file = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    return result_file
+
+def main():
+    """
+    Wait on stdin for one job and grade it. Each test result is written to stdout
+    as its own frame the moment it's ready; an empty frame means all tests are done.
+    """
+    limit_resources(int(sys.argv[1]))
+    result_file = take_stdout()
+    
+    job = marshal.loads(sys.stdin.buffer.read())
+    run_tests(job, lambda result: send_frame(result_file, encode(result)))
+    send_frame(result_file, b'')
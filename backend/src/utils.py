@@ -6,11 +6,243 @@ The complex logic for running the user's Python code securely (well, somewhat se
 is kept here to keep the main code clean.
 """
 
+import os
+import sys
 import json
+import marshal
+import orjson
+import time
+import shlex
+import struct
+import hashlib
+import selectors
 import subprocess
-from typing import List, Dict, Any
+import collections
+from typing import List, Dict, Any, Callable, Optional
 
-def execute_code(code: str, function_signature: str, test_cases: List[Dict]) -> Dict[str, Any]:
+# --------------------------
+# WARM WORKER POOL
+# --------------------------
+
+# What each standby worker runs: import the test runner (runner/driver.py) and wait
+# on stdin for a job. It's imported rather than run as a script so that Python
+# caches its bytecode.
+_RUNNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runner')
+_WORKER_SRC = f"import sys; sys.path.insert(0, {_RUNNER_DIR!r}); import driver; driver.main()"
+
+# Address space each worker may use, in megabytes (the interpreter itself needs ~20)
+GRADER_MEMORY_MB = int(os.getenv('GRADER_MEMORY_MB', 256))
+
+# Optional command that wraps every worker in a real sandbox, e.g.
+# "nsjail -Mo -q --chroot / --". Without it, workers are plain child processes that
+# only have the resource limits above: fine for friends, not for strangers.
+GRADER_SANDBOX_CMD = shlex.split(os.getenv('GRADER_SANDBOX_CMD', ''))
+
+class WorkerPool:
+    """
+    Keeps `size` Python processes started and waiting, so a submission doesn't pay
+    for interpreter startup. Each worker grades exactly one submission and then exits,
+    so nothing a player's code does can leak into the next run. Taking a worker
+    immediately starts its replacement.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = collections.deque()
+    
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [*GRADER_SANDBOX_CMD, sys.executable, '-c', _WORKER_SRC, str(GRADER_MEMORY_MB)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+    
+    def acquire(self) -> subprocess.Popen:
+        """Take a ready worker (or start one if none are waiting) and top the pool back up."""
+        proc = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.poll() is None:  # Skip any that died while idle
+                proc = candidate
+                break
+        if proc is None:
+            proc = self._spawn()
+        while len(self._idle) < self.size:
+            self._idle.append(self._spawn())
+        return proc
+
+# How many idle workers to keep ready. Set to 0 to start a fresh process per submission.
+_pool = WorkerPool(int(os.getenv('GRADER_WARM_WORKERS', 2)))
+
+# --------------------------
+# RESULT CACHE
+# --------------------------
+
+# Exact resubmissions (double clicks, retries after a reconnect, copied code) get the
+# previous result back without running anything. Only completed runs are stored, not
+# timeouts or crashes, and entries expire after a while.
+_RESULT_CACHE_SIZE = 256
+_RESULT_CACHE_TTL = float(os.getenv('GRADER_RESULT_CACHE_TTL', 300))  # Seconds; 0 turns the cache off
+_results: collections.OrderedDict[tuple, tuple[float, Dict[str, Any]]] = collections.OrderedDict()
+
+def _code_key(code: str) -> bytes:
+    """Short hash identifying a submission's source code."""
+    return hashlib.blake2b(code.encode(), digest_size=16).digest()
+
+def _cached_result(key: tuple) -> Optional[Dict[str, Any]]:
+    """A stored result for this (problem, code, fail_fast), if there's a fresh one."""
+    entry = _results.get(key)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    if time.monotonic() - stored_at > _RESULT_CACHE_TTL:
+        del _results[key]
+        return None
+    _results.move_to_end(key)
+    return result
+
+def _store_result(key: tuple, result: Dict[str, Any]):
+    if _RESULT_CACHE_TTL <= 0:
+        return
+    _results[key] = (time.monotonic(), result)
+    _results.move_to_end(key)
+    if len(_results) > _RESULT_CACHE_SIZE:
+        _results.popitem(last=False)
+
+# --------------------------
+# PROBLEM CACHE
+# --------------------------
+
+# The problem half of a job (function name and test cases) never changes, so each
+# problem is marshalled once. Keyed by id() of its test case list: the problem
+# templates are shared read-only (see constants.py). The list itself is kept in
+# the entry so a reused id() can never match a different problem.
+_problem_parts: Dict[int, tuple[List[Dict], bytes]] = {}
+
+def _problem_part(function_signature: str, test_cases: List[Dict]) -> bytes:
+    """Marshalled {'fn', 'cases'} for a problem, ready to embed in a job."""
+    entry = _problem_parts.get(id(test_cases))
+    if entry is not None and entry[0] is test_cases:
+        return entry[1]
+    
+    # Extract function name from signature (e.g., 'def twoSum(...)' -> 'twoSum')
+    function_name = function_signature.split('(', 1)[0].removeprefix('def ').strip()
+    part = marshal.dumps({'fn': function_name, 'cases': test_cases})
+    if len(_problem_parts) >= 256:  # Only reached if callers pass throwaway test lists
+        _problem_parts.clear()
+    _problem_parts[id(test_cases)] = (test_cases, part)
+    return part
+
+# --------------------------
+# READING WORKER OUTPUT
+# --------------------------
+
+# Results bigger than this (e.g. a function returning a huge list) are rejected.
+# Only the tail of stderr is kept: that's where the traceback is.
+MAX_OUTPUT_BYTES = 1024 * 1024
+MAX_STDERR_BYTES = 64 * 1024
+
+class OutputLimitExceeded(Exception):
+    """The worker's results were bigger than MAX_OUTPUT_BYTES."""
+
+def _split_frames(stdout: bytearray, on_frame: Callable[[bytes], None]):
+    """Hand every complete frame at the start of `stdout` to `on_frame` and remove it."""
+    while len(stdout) >= 4:
+        size = struct.unpack_from('>I', stdout)[0]
+        if len(stdout) < 4 + size:
+            break
+        on_frame(bytes(stdout[4:4 + size]))
+        del stdout[:4 + size]
+
+def _run_worker_windows(process: subprocess.Popen, job: bytes, timeout: float, on_frame: Callable[[bytes], None]) -> bytes:
+    """
+    _run_worker() for Windows, where select() only works on sockets, not pipes.
+    communicate() reads both pipes in helper threads instead, so frames are only
+    handed on once the worker has exited and the output limit is checked afterwards.
+    """
+    try:
+        stdout, stderr = process.communicate(input=job, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    if len(stdout) > MAX_OUTPUT_BYTES:
+        raise OutputLimitExceeded()
+    
+    buffer = bytearray(stdout)
+    _split_frames(buffer, on_frame)
+    if buffer:
+        raise ValueError('Worker output ended in the middle of a frame')
+    return stderr[-MAX_STDERR_BYTES:]
+
+def _run_worker(process: subprocess.Popen, job: bytes, timeout: float, on_frame: Callable[[bytes], None]) -> bytes:
+    """
+    Send a worker its job and read its output as it arrives, instead of letting
+    communicate() buffer however much the worker writes. stdout is a stream of
+    frames (a 4-byte big-endian length, then the payload); each complete frame is
+    handed to `on_frame` straight away. Returns what the worker wrote to stderr.
+    Kills the worker and raises on timeout or when stdout grows past the limit.
+    """
+    if os.name == 'nt':
+        return _run_worker_windows(process, job, timeout, on_frame)
+    
+    deadline = time.monotonic() + timeout
+    try:
+        process.stdin.write(job)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # Worker already exited (e.g. hit a resource limit); its stderr says why
+    
+    stdout, stderr = bytearray(), bytearray()
+    stdout_total = 0
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout.fileno(), selectors.EVENT_READ, stdout)
+        selector.register(process.stderr.fileno(), selectors.EVENT_READ, stderr)
+        try:
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(process.args, timeout)
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        selector.unregister(key.fd)
+                        continue
+                    buffer = key.data
+                    buffer += chunk
+                    if buffer is stderr:
+                        if len(stderr) > MAX_STDERR_BYTES:
+                            del stderr[:-MAX_STDERR_BYTES]
+                        continue
+                    
+                    stdout_total += len(chunk)
+                    if stdout_total > MAX_OUTPUT_BYTES:
+                        raise OutputLimitExceeded()
+                    # Pass on every frame that has fully arrived
+                    _split_frames(stdout, on_frame)
+        except BaseException:
+            # Don't leave a runaway (e.g. infinite loop) worker behind
+            process.kill()
+            process.wait()
+            raise
+    
+    # Both pipes are closed, but the worker may still be running (it can close its
+    # own stdout/stderr and keep going), so the same deadline applies to the exit
+    try:
+        process.wait(timeout=max(0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise
+    if stdout:
+        raise ValueError('Worker output ended in the middle of a frame')
+    return bytes(stderr)
+
+def execute_code(
+    code: str, function_signature: str, test_cases: List[Dict],
+    fail_fast: bool = False, allow_debug_skip: bool = False,
+    on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
     """
     Execute Python code submitted by a player against a set of test cases.
     
@@ -18,18 +250,24 @@ def execute_code(code: str, function_signature: str, test_cases: List[Dict]) ->
         code: The Python code written by the player.
         function_signature: The definition of the function they need to write (e.g., 'def twoSum(...)').
         test_cases: A list of inputs and expected outputs to test their code.
+        fail_fast: Stop at the first failing test. testResults then ends with that test.
+        allow_debug_skip: Honour the debug auto-complete comment (dev servers only).
+        on_result: Called as on_result(index, test_result) as soon as each test finishes,
+            before the whole run is done (e.g. to show progress).
         
     Returns:
         A dictionary containing:
         - passed: Boolean, True if all tests passed.
         - testResults: List of results for each test case.
         - error: String, error message if something crashed.
+        The same dictionary may be returned again for an identical resubmission,
+        so treat it as read-only.
     """
     
     # 1. SPECIAL DEBUG TRICK
-    # If the code contains this specific comment, we automatically pass it.
+    # If the code starts with this specific comment, we automatically pass it.
     # This is useful for testing the game flow without writing real algorithms.
-    if '# DEBUG: Auto-complete' in code:
+    if allow_debug_skip and code.startswith('# DEBUG: Auto-complete'):
         return {
             'passed': True,
             'testResults': [{'passed': True, 'input': 'DEBUG', 'expected': 'SKIP', 'actual': 'SKIP'}],
@@ -37,106 +275,98 @@ def execute_code(code: str, function_signature: str, test_cases: List[Dict]) ->
         }
     
     try:
-        # 2. BUILD THE TEST SCRIPT
-        # We are going to create a temporary Python script that includes:
-        # - The player's code
-        # - A test runner that loops through inputs and checks outputs
-        script = f"""
-{code}
-
-# Test runner setup
-import json
-test_results = []
-"""
+        # 2. CHECK FOR AN IDENTICAL EARLIER SUBMISSION
+        problem_part = _problem_part(function_signature, test_cases)
+        code_key = _code_key(code)
+        cache_key = (problem_part, code_key, fail_fast)
+        cached = _cached_result(cache_key)
+        if cached is not None:
+            if on_result is not None:
+                for index, test_result in enumerate(cached['testResults']):
+                    on_result(index, test_result)
+            return cached
         
-        # Add code to run each test case
-        for i, test_case in enumerate(test_cases):
-            input_dict = test_case['input']
-            expected = test_case['expectedOutput']
-            
-            # Extract function name from signature (e.g., 'def twoSum(...)' -> 'twoSum')
-            function_name = function_signature.split('(')[0].replace('def ', '').strip()
-            
-            # Format arguments (e.g., "nums=[2,7], target=9")
-            args_str = ', '.join([f"{k}={repr(v)}" for k, v in input_dict.items()])
-            
-            # Add the test logic to the script
-            script += f"""
-try:
-    # Call the user's function
-    result_{i} = {function_name}({args_str})
-    expected_{i} = {repr(expected)}
-    
-    # Check if result matches expected
-    passed_{i} = result_{i} == expected_{i}
-    
-    # Record the result
-    test_results.append({{
-        'passed': passed_{i},
-        'input': {json.dumps(input_dict)},
-        'expected': expected_{i},
-        'actual': result_{i}
-    }})
-except Exception as e:
-    # If the user's code crashes, record the error
-    test_results.append({{
-        'passed': False,
-        'input': {json.dumps(input_dict)},
-        'expected': {repr(expected)},
-        'actual': None,
-        'error': str(e)
-    }})
-"""
-        
-        # Finally, print the results as JSON so we can read them back
-        script += """
-print(json.dumps(test_results))
-"""
+        # 3. DESCRIBE THE JOB
+        # Instead of generating a script with one block per test, we send the worker
+        # plain data: the player's code, plus the function to call and the test cases.
+        # The worker compiles the code itself: compiling untrusted code here would
+        # hold up the whole server for as long as the compiler takes.
+        job = marshal.dumps({
+            'code': code,
+            'problem': problem_part,
+            'fail_fast': fail_fast
+        })
         
-        # 3. RUN THE SCRIPT
-        # We use subprocess to run this script in a separate process.
+        # 4. RUN THE TESTS
+        # We hand the job to a separate, already-started Python process.
         # This prevents the user's code from crashing OUR server.
-        process = subprocess.Popen(
-            ['python', '-c', script],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        process = _pool.acquire()
         
-        # Wait for max 10 seconds
-        stdout, stderr = process.communicate(timeout=10)
+        # Collect results as the worker streams them back, one per test
+        test_results = []
+        finished = False
         
-        # 4. HANDLE ERRORS
-        if process.returncode != 0:
+        def on_frame(payload: bytes):
+            nonlocal finished
+            if not payload:  # Empty frame: the worker got through every test
+                finished = True
+                return
+            if payload.startswith(b'J'):
+                # Encoded by the stdlib (see encode() in runner/driver.py) because it
+                # holds ints over 64 bits, which orjson would turn into floats
+                result = json.loads(payload[1:])
+            else:
+                result = orjson.loads(payload)
+            test_results.append(result)
+            if on_result is not None:
+                on_result(len(test_results) - 1, result)
+        
+        # Wait for max 10 seconds
+        try:
+            stderr = _run_worker(process, job, timeout=10, on_frame=on_frame)
+        except ValueError:  # A frame that isn't valid JSON, or output cut off mid-frame
             return {
                 'passed': False,
                 'testResults': [],
-                'error': stderr or 'Execution failed'
+                'error': 'Could not parse test results'
             }
         
-        # 5. PARSE RESULTS
-        try:
-            # The last line of output should be our JSON results
-            test_results = json.loads(stdout.strip().split('\n')[-1])
-            all_passed = all(t.get('passed', False) for t in test_results)
+        # 5. HANDLE ERRORS
+        if process.returncode != 0:
             return {
-                'passed': all_passed,
-                'testResults': test_results,
-                'error': None
+                'passed': False,
+                'testResults': [],
+                'error': stderr.decode('utf-8', 'replace') or 'Execution failed'
             }
-        except json.JSONDecodeError:
+        
+        if not finished:  # Exited cleanly but stopped early (e.g. the player's code called os._exit)
             return {
                 'passed': False,
                 'testResults': [],
                 'error': 'Could not parse test results'
             }
-            
+        
+        # 6. SUMMARIZE RESULTS
+        result = {
+            'passed': all(t.get('passed', False) for t in test_results),
+            'testResults': test_results,
+            'error': None
+        }
+        _store_result(cache_key, result)
+        return result
+    
     except subprocess.TimeoutExpired:
         return {
             'passed': False,
             'testResults': [],
             'error': 'Code execution timed out (10 seconds max)'
         }
+    except OutputLimitExceeded:
+        return {
+            'passed': False,
+            'testResults': [],
+            'error': 'Test results too large (1 MB max)'
+        }
     except Exception as e:
         return {
             'passed': False,
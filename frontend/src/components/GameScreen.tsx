@@ -118,6 +118,16 @@ export function GameScreen({ emitSelectCard, emitSubmitSolution, emitPlayerElimi
             }
         }
 
+        // Results stream in one test at a time while the rest are still running
+        const handleTestResult = (data: { cardId: string; index: number; total: number; result: { passed: boolean; error?: string } }) => {
+            if (!data.result.passed) {
+                setTestFeedback({
+                    type: 'error',
+                    message: `Test ${data.index + 1} of ${data.total} failed${data.result.error ? `: ${data.result.error}` : ''}`
+                })
+            }
+        }
+
         const handleTargetSelectionRequired = (data: any) => {
             // Show player selection modal after celebration
             setTimeout(() => {
@@ -140,12 +150,14 @@ export function GameScreen({ emitSelectCard, emitSubmitSolution, emitPlayerElimi
 
         socket.on('solution_passed', handleSolutionPassed)
         socket.on('solution_failed', handleSolutionFailed)
+        socket.on('test_result', handleTestResult)
         socket.on('target_selection_required', handleTargetSelectionRequired)
         socket.on('flashbang_applied', handleFlashbang)
 
         return () => {
             socket.off('solution_passed', handleSolutionPassed)
             socket.off('solution_failed', handleSolutionFailed)
+            socket.off('test_result', handleTestResult)
             socket.off('target_selection_required', handleTargetSelectionRequired)
             socket.off('flashbang_applied', handleFlashbang)
         }
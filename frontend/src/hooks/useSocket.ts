@@ -20,8 +20,11 @@ export const useSocket = () => {
     } = useGameStore()
 
     useEffect(() => {
+        // Connect over WebSocket straight away instead of starting on HTTP long-polling
+        // and upgrading; fall back to polling only if WebSocket can't be established.
         const newSocket = io(SOCKET_URL, {
-            transports: ['polling', 'websocket'],
+            transports: ['websocket', 'polling'],
+            tryAllTransports: true,
         })
 
         newSocket.on('connect', () => {
@@ -90,6 +93,11 @@ export const useSocket = () => {
 
         // Listen for card selected
         newSocket.on('card_selected', (data: { playerId: string; cardId: string; problem: any }) => {
+            // Snapshots only carry an opponent's current card, so we may not have this one yet
+            const player = useGameStore.getState().players[data.playerId]
+            if (player && !player.cards.some(c => c.id === data.cardId)) {
+                addCard(data.playerId, { id: data.cardId, problem: data.problem })
+            }
             updatePlayer(data.playerId, { currentProblem: data.cardId })
             // If it's the current player, update selectedCardId
             if (data.playerId === useGameStore.getState().currentPlayerId) {
@@ -123,43 +131,15 @@ export const useSocket = () => {
             console.error('[Socket] Solution failed:', data)
         })
 
-        // Listen for reward applied
-        newSocket.on('reward_applied', (data: {
-            playerId?: string
-            effect: string
-            value: number
-            fromPlayer?: string
-            affectedPlayers?: Array<{ playerId: string, username: string }>
-        }) => {
-            // Handle different reward types
-            if (data.effect === 'add_time' && data.playerId) {
-                const player = useGameStore.getState().players[data.playerId]
-                if (player && player.timerEndTime) {
-                    const newEndTime = player.timerEndTime + (data.value * 1000)
-                    updatePlayer(data.playerId, { timerEndTime: newEndTime })
-                }
-            } else if (data.effect === 'remove_time' && data.playerId) {
-                const player = useGameStore.getState().players[data.playerId]
-                if (player && player.timerEndTime) {
-                    const newEndTime = Math.max(Date.now(), player.timerEndTime - (data.value * 1000))
-                    updatePlayer(data.playerId, { timerEndTime: newEndTime })
+        // Listen for batched timer updates (rewards/debuffs), sent at most every 100ms per room
+        newSocket.on('state_delta', (data: { players: Record<string, { timerEndTime: number }> }) => {
+            const players = useGameStore.getState().players
+            Object.entries(data.players).forEach(([playerId, { timerEndTime }]) => {
+                // Skip players who have already left
+                if (players[playerId]) {
+                    updatePlayer(playerId, { timerEndTime })
                 }
-            } else if (data.effect === 'remove_time_targeted' && data.playerId) {
-                const player = useGameStore.getState().players[data.playerId]
-                if (player && player.timerEndTime) {
-                    const newEndTime = Math.max(Date.now(), player.timerEndTime - (data.value * 1000))
-                    updatePlayer(data.playerId, { timerEndTime: newEndTime })
-                }
-            } else if (data.effect === 'remove_time_all' && data.affectedPlayers) {
-                // Update all affected players
-                data.affectedPlayers.forEach(({ playerId }) => {
-                    const player = useGameStore.getState().players[playerId]
-                    if (player && player.timerEndTime) {
-                        const newEndTime = Math.max(Date.now(), player.timerEndTime - (data.value * 1000))
-                        updatePlayer(playerId, { timerEndTime: newEndTime })
-                    }
-                })
-            }
+            })
         })
 
         // Listen for player eliminated